@@ -43,14 +43,17 @@ with tab_login:
             stored_hash = user_record[2]  # Index 2 is the hash
 
             if verify_password(login_password, stored_hash):
+                db.audit.log(login_username, "login_success", "user", login_username)
                 st.session_state.logged_in = True
                 st.session_state.username = login_username
                 st.success(f"Welcome back, {login_username}! 🎉")
                 # Redirect to dashboard
                 st.switch_page("pages/1_Dashboard.py")
             else:
+                db.audit.log(login_username, "login_failed", "user", login_username, {"reason": "bad_password"})
                 st.error("Invalid password.")
         else:
+            db.audit.log(login_username, "login_failed", "user", login_username, {"reason": "unknown_user"})
             st.error("User not found.")
 
 # ----- REGISTER TAB -----
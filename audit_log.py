@@ -0,0 +1,263 @@
+import sqlite3
+import atexit
+import json
+import os
+import threading
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+
+from db_manager import DB_NAME, BUSY_TIMEOUT_SECONDS, WRITER_SOCKET_ENV, retry_on_busy
+
+# Flush to the DB once this many events are waiting, or every FLUSH_INTERVAL_SECONDS, whichever comes first
+FLUSH_BATCH_SIZE = 100
+FLUSH_INTERVAL_SECONDS = 2.0
+
+# Hard cap on the in-memory buffer. When it fills up, log() tries a flush straight away.
+# Only if that flush fails too is an event dropped, and every drop is counted and reported.
+BUFFER_CAPACITY = 10000
+
+INSERT_SQL = ("INSERT INTO audit_log (timestamp, username, action, entity_type, entity_id, details) "
+              "VALUES (?, ?, ?, ?, ?, ?)")
+
+AuditEntry = namedtuple("AuditEntry", ["id", "timestamp", "username", "action", "entity_type", "entity_id", "details"])
+
+
+def create_audit_table(conn):
+    """
+    Creates the audit_log table, its lookup indexes, and triggers that make it append-only.
+    Shared with write_coordinator.py, which runs it when the writer service starts.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            username TEXT,
+            action TEXT NOT NULL,
+            entity_type TEXT,
+            entity_id TEXT,
+            details TEXT
+        )
+    ''')
+    # Indexes for the three ways we look entries up: by user, by entity, by time
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_user_time ON audit_log (username, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_entity_time ON audit_log (entity_type, entity_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_log (timestamp)")
+    # Append-only: the DB itself refuses to change or remove an audit entry
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audit_log_no_update BEFORE UPDATE ON audit_log
+        BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audit_log_no_delete BEFORE DELETE ON audit_log
+        BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END
+    ''')
+    retry_on_busy(conn.commit)
+
+
+class AuditLogger:
+    """
+    Persistent trail of security actions (logins, incident changes, ticket creation...).
+    Events go into an in-memory buffer and a background thread writes them in batches,
+    so logging an action doesn't add a DB write to every button click.
+    """
+
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+        self._buffer = deque()  # No maxlen: a deque with maxlen silently throws away old entries
+        self.dropped = 0        # Events lost because the buffer was full and the DB couldn't be reached
+        self._lock = threading.Lock()          # Protects the buffer
+        self._flush_lock = threading.Lock()    # Only one flush writes at a time, so entries stay in order
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.create_table()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        # Guarantee whatever is still buffered gets written when the process exits
+        atexit.register(self.close)
+
+    def create_table(self):
+        """
+        Creates the audit table unless a writer service is configured
+        (the writer creates it at startup, so other processes never write schema).
+        """
+        if os.environ.get(WRITER_SOCKET_ENV):
+            return
+        conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_SECONDS)
+        try:
+            create_audit_table(conn)
+        finally:
+            conn.close()
+
+    def log(self, username, action, entity_type=None, entity_id=None, details=None):
+        """
+        Records one event. Returns immediately; the write happens in the next batch.
+        details can be any JSON-friendly value (e.g. {"status": "Closed"}).
+        """
+        timestamp = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+        entry = (
+            timestamp,
+            username,
+            action,
+            entity_type,
+            None if entity_id is None else str(entity_id),
+            None if details is None else json.dumps(details),
+        )
+
+        with self._lock:
+            buffer_full = len(self._buffer) >= BUFFER_CAPACITY
+
+        if buffer_full:
+            # Background flushes fell far behind: try one now on this thread.
+            # A failure here must never crash the page that is logging (e.g. a login).
+            try:
+                self.flush()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Audit flush failed while buffer full: {e}")
+
+        with self._lock:
+            if len(self._buffer) >= BUFFER_CAPACITY:
+                self.dropped += 1
+                dropped = True
+            else:
+                self._buffer.append(entry)
+                dropped = False
+            pending = len(self._buffer)
+
+        if dropped:
+            print(f"WARNING: audit buffer full, dropped event {action!r} by {username!r} "
+                  f"({self.dropped} dropped so far)")
+        elif pending >= FLUSH_BATCH_SIZE:
+            self._wake.set()
+
+    def flush(self):
+        """ Writes everything currently buffered in one transaction. Returns how many entries were written. """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._buffer)
+                self._buffer.clear()
+            if not batch:
+                return 0
+
+            try:
+                self._write_batch(batch)
+            except (sqlite3.Error, OSError):
+                # Put the batch back in front so it's retried on the next flush
+                with self._lock:
+                    self._buffer.extendleft(reversed(batch))
+                    overflow = len(self._buffer) - BUFFER_CAPACITY
+                    # If new events arrived meanwhile we may be over the cap: drop the newest, and say so
+                    for _ in range(max(overflow, 0)):
+                        self._buffer.pop()
+                    if overflow > 0:
+                        self.dropped += overflow
+                if overflow > 0:
+                    print(f"WARNING: audit buffer over capacity after failed flush, dropped {overflow} events "
+                          f"({self.dropped} dropped so far)")
+                raise
+            return len(batch)
+
+    def _write_batch(self, batch):
+        """
+        Inserts a batch in one transaction. In a multi-process deployment it goes through
+        the writer service like every other write, so audit flushes don't fight over the lock.
+        """
+        socket_path = os.environ.get(WRITER_SOCKET_ENV)
+        if socket_path:
+            # Imported here: write_coordinator imports this module for create_audit_table
+            from write_coordinator import WriteClient
+            WriteClient(socket_path, self.db_name).execute_many(INSERT_SQL, batch)
+            return
+
+        def attempt():
+            conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_SECONDS)
+            try:
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+            finally:
+                conn.close()
+
+        retry_on_busy(attempt)
+
+    def query(self, username=None, entity_type=None, entity_id=None, since=None, until=None, limit=100):
+        """
+        Looks up audit entries, newest first. Every filter is optional.
+        since/until are ISO timestamps (UTC), e.g. "2025-01-31T00:00:00".
+        """
+        self.flush()  # So events logged a moment ago are included
+
+        conditions = []
+        params = []
+        if username is not None:
+            conditions.append("username = ?")
+            params.append(username)
+        if entity_type is not None:
+            conditions.append("entity_type = ?")
+            params.append(entity_type)
+        if entity_id is not None:
+            conditions.append("entity_id = ?")
+            params.append(str(entity_id))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+
+        sql = "SELECT id, timestamp, username, action, entity_type, entity_id, details FROM audit_log"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_SECONDS)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        return [AuditEntry._make(row) for row in rows]
+
+    def close(self):
+        """ Stops the background thread and writes anything still buffered """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self.flush()
+        except (sqlite3.Error, OSError) as e:
+            print(f"WARNING: audit flush on shutdown failed, {len(self._buffer)} events not saved: {e}")
+
+    def _flush_loop(self):
+        while not self._closed:
+            # Wakes up early if log() saw the batch size reached
+            self._wake.wait(FLUSH_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Audit flush failed, will retry: {e}")
+
+
+# One logger per DB file, shared by every page in the process.
+# Streamlit re-runs page scripts constantly, so creating a logger per run would start a new thread each time.
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_audit_logger(db_name=DB_NAME):
+    """ Returns the shared AuditLogger for this database, creating it the first time """
+    with _loggers_lock:
+        if db_name not in _loggers:
+            _loggers[db_name] = AuditLogger(db_name)
+        return _loggers[db_name]
+
+
+#  TEMPORARY TEST CODE
+if __name__ == "__main__":
+    audit = get_audit_logger()
+    audit.log("admin", "test_event", "cyber_incident", 1, {"note": "audit smoke test"})
+    for entry in audit.query(username="admin", limit=5):
+        print(entry)
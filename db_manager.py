@@ -1,10 +1,84 @@
 import sqlite3
 import os
-import pandas as pd
+import time
+import random
+import uuid
+from collections import namedtuple
 
 # Global constant for the database name
 DB_NAME = "platform_data_final.db"
 
+# Set this to the writer service's socket path to send all writes through it
+# (see write_coordinator.py). Leave it unset to write straight to the DB file.
+WRITER_SOCKET_ENV = "PLATFORM_WRITER_SOCKET"
+
+# Busy handling: wait briefly inside SQLite, then back off and retry ourselves,
+# instead of one long 30 second stall.
+BUSY_TIMEOUT_SECONDS = 2
+BUSY_RETRIES = 8
+BUSY_BACKOFF_BASE = 0.02
+BUSY_BACKOFF_MAX = 1.0
+
+# How many rows we pull from the cursor at a time when building column arrays
+FETCH_BATCH_SIZE = 10000
+
+# --- ROW MODELS ---
+# Lightweight typed rows. A namedtuple has no per-instance __dict__ (it uses
+# __slots__ = ()), so it costs the same as a plain tuple but each field has a name.
+# They are still tuples, so old code that does row[2] keeps working.
+CyberIncident = namedtuple("CyberIncident", ["id", "incident_type", "severity", "status", "timestamp"])
+DatasetMetadata = namedtuple("DatasetMetadata", ["id", "dataset_name", "row_count", "file_size_mb"])
+ITTicket = namedtuple("ITTicket", ["id", "ticket_id", "issue_desc", "priority", "assigned_to"])
+
+# Declared SQLite type of each row model field (same order as the fields).
+# The columnar path picks NumPy dtypes from these, so the dtype never depends on the data itself.
+COLUMN_TYPES = {
+    CyberIncident: ("INTEGER", "TEXT", "TEXT", "TEXT", "DATETIME"),
+    DatasetMetadata: ("INTEGER", "TEXT", "INTEGER", "REAL"),
+    ITTicket: ("INTEGER", "TEXT", "TEXT", "TEXT", "TEXT"),
+}
+
+# Optional instrumentation hook, used by load_test_pages.py. When set it is called as
+#   listener("init", db_name)  each time a DatabaseManager is created (once per page run)
+#   listener("query", sql)     for every SQL statement run through get_connection()
+_instrumentation_listener = None
+
+# DB files whose schema has already been checked by this process (so page reruns don't repeat it)
+_migrated_dbs = set()
+
+
+def set_instrumentation_listener(listener):
+    """ Installs (or with None, removes) the instrumentation listener """
+    global _instrumentation_listener
+    _instrumentation_listener = listener
+
+
+def is_busy_error(error):
+    """ True if SQLite gave up because another connection held the lock """
+    message = str(error).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def retry_on_busy(func, retries=BUSY_RETRIES):
+    """
+    Calls func(), retrying on "database is locked" with exponential backoff plus random jitter.
+    The jitter stops several processes from all retrying at the exact same moment.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == retries:
+                raise
+            delay = min(BUSY_BACKOFF_MAX, BUSY_BACKOFF_BASE * (2 ** attempt))
+            time.sleep(random.uniform(0, delay))
+
+
+# The ways a read method can hand back its results
+OUTPUT_ROWS = "rows"            # list of row models
+OUTPUT_COLUMNS = "columns"      # dict of {column name: NumPy array}
+OUTPUT_DATAFRAME = "dataframe"  # pandas DataFrame built straight from the column arrays
+
 
 class DatabaseManager:
     """
@@ -14,52 +88,96 @@ class DatabaseManager:
     # --- TIER 2: DATA SCIENCE DOMAIN ---
     def add_dataset_metadata(self, name, rows, size_mb):
         """ Log a new dataset upload """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO datasets_metadata (dataset_name, row_count, file_size_mb) VALUES (?, ?, ?)",
-                       (name, rows, size_mb))
-        conn.commit()
-        conn.close()
+        self.execute_write("INSERT INTO datasets_metadata (dataset_name, row_count, file_size_mb) VALUES (?, ?, ?)",
+                           (name, rows, size_mb))
+
+    def get_datasets(self, output=OUTPUT_DATAFRAME):
+        """ Get all datasets (as rows, column arrays or a DataFrame) """
+        sql = "SELECT id, dataset_name, row_count, file_size_mb FROM datasets_metadata"
+        return self.fetch(sql, DatasetMetadata, output)
+
+    def create_it_ticket(self, issue, priority, assigned_to, username="system"):
+        """ Create IT Ticket (gets its own unique reference like TCK-1A2B3C4D) """
+        ticket_ref = f"TCK-{uuid.uuid4().hex[:8].upper()}"
+        last_id, _ = self.execute_write("INSERT INTO it_tickets (ticket_id, issue_desc, priority, assigned_to) VALUES (?, ?, ?, ?)",
+                                        (ticket_ref, issue, priority, assigned_to))
+        self.audit.log(username, "create_ticket", "it_ticket", last_id,
+                       {"ticket_id": ticket_ref, "priority": priority, "assigned_to": assigned_to})
+        return last_id
 
-    def get_datasets(self):
-        """ Get all datasets """
-        conn = self.get_connection()
-        df = pd.read_sql("SELECT * FROM datasets_metadata", conn)
-        conn.close()
-        return df
-
-    def create_it_ticket(self, issue, priority, assigned_to):
-        """ Create IT Ticket """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO it_tickets (issue_desc, priority, status, ticket_id) VALUES (?, ?, 'Open', ?)",
-                       (issue, priority, assigned_to)) # using ticket_id col for 'Assigned Agent' to save time
-        conn.commit()
-        conn.close()
-
-    def get_it_tickets(self):
-        """ Get all tickets """
-        conn = self.get_connection()
-        df = pd.read_sql("SELECT * FROM it_tickets", conn)
-        conn.close()
-        return df
+    def get_it_tickets(self, output=OUTPUT_DATAFRAME):
+        """ Get all tickets (as rows, column arrays or a DataFrame) """
+        sql = "SELECT id, ticket_id, issue_desc, priority, assigned_to FROM it_tickets"
+        return self.fetch(sql, ITTicket, output)
 
     def __init__(self, db_name=DB_NAME):
         """
         Constructor: Checks if DB exists and initializes tables if needed.
         """
         self.db_name = db_name
+        if _instrumentation_listener is not None:
+            _instrumentation_listener("init", db_name)
         # If the file doesn't exist yet, we create the tables immediately
         if not os.path.exists(self.db_name):
             print(f"--- Database '{self.db_name}' not found. Initializing... ---")
             self.create_tables()
+        elif self.db_name not in _migrated_dbs:
+            self.migrate_schema()
+        _migrated_dbs.add(self.db_name)
 
     def get_connection(self):
         """
         Opens a connection to the SQLite database.
-        Added timeout to prevent OneDrive/File locking errors.
+        Uses WAL mode so readers never block behind a writer (or the other way round).
+        The timeout is kept short; writes retry with backoff instead (see retry_on_busy).
+        """
+        conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_SECONDS)
+        if _instrumentation_listener is not None:
+            listener = _instrumentation_listener
+            conn.set_trace_callback(lambda sql: listener("query", sql))
+        # WAL is stored in the DB file, so normally it is already on and this is just a read
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if mode.lower() != "wal":
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError as e:
+                # Switching needs every other connection out of the way. If that isn't possible
+                # right now this connection still works, and a later one will make the switch.
+                if not is_busy_error(e):
+                    raise
+        return conn
+
+    @property
+    def audit(self):
+        """ Shared audit logger for this DB (see audit_log.py) """
+        # Imported here to avoid a circular import (audit_log imports this module)
+        from audit_log import get_audit_logger
+        return get_audit_logger(self.db_name)
+
+    def execute_write(self, sql, params=()):
+        """
+        Runs one INSERT/UPDATE/DELETE and returns (lastrowid, rowcount).
+        If a writer service is running (PLATFORM_WRITER_SOCKET is set) the write is sent there,
+        so many Streamlit processes share one writer (it refuses writes meant for a different DB file).
+        Otherwise we write directly, retrying if busy.
         """
-        return sqlite3.connect(self.db_name, timeout=30)
+        socket_path = os.environ.get(WRITER_SOCKET_ENV)
+        if socket_path:
+            # Imported here to avoid a circular import (write_coordinator imports this module)
+            from write_coordinator import WriteClient
+            return WriteClient(socket_path, self.db_name).execute(sql, params)
+
+        def attempt():
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                conn.commit()
+                return cursor.lastrowid, cursor.rowcount
+            finally:
+                conn.close()
+
+        return retry_on_busy(attempt)
 
     def create_tables(self):
         """
@@ -106,7 +224,8 @@ class DatabaseManager:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 ticket_id TEXT UNIQUE,
                 issue_desc TEXT,
-                priority TEXT
+                priority TEXT,
+                assigned_to TEXT
             )
         ''')
 
@@ -114,6 +233,98 @@ class DatabaseManager:
         conn.close()
         print("Database tables created successfully.")
 
+    def migrate_schema(self):
+        """
+        Brings an older DB file up to date with create_tables().
+        Older files have no assigned_to column on it_tickets (the agent used to be
+        squeezed into the UNIQUE ticket_id column, which allowed one ticket per agent).
+        """
+        conn = self.get_connection()
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(it_tickets)")]
+            if columns and "assigned_to" not in columns:
+                # One-off schema change, so it runs directly rather than through the writer service
+                try:
+                    retry_on_busy(lambda: conn.execute("ALTER TABLE it_tickets ADD COLUMN assigned_to TEXT"))
+                    conn.commit()
+                    print("Migrated it_tickets: added assigned_to column.")
+                except sqlite3.OperationalError as e:
+                    # Another process got there first, which is fine
+                    if "duplicate column name" not in str(e):
+                        raise
+        finally:
+            conn.close()
+
+    #  SHARED READ PATH
+
+    def fetch(self, sql, row_model, output=OUTPUT_ROWS, params=()):
+        """
+        Runs a SELECT and returns the result in the format the caller asked for.
+        - "rows": list of row_model namedtuples (no pandas needed)
+        - "columns": dict of NumPy arrays, filled straight from the cursor
+        - "dataframe": DataFrame wrapping those arrays without copying them again
+        """
+        if output not in (OUTPUT_ROWS, OUTPUT_COLUMNS, OUTPUT_DATAFRAME):
+            raise ValueError(f"Unknown output format: {output!r}")
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            if output == OUTPUT_ROWS:
+                # Iterate the cursor directly: fetchall() would build a second full list of plain tuples
+                return [row_model._make(row) for row in cursor]
+            columns = self._fetch_columns(cursor, row_model._fields, COLUMN_TYPES[row_model])
+        finally:
+            conn.close()
+
+        if output == OUTPUT_COLUMNS:
+            return columns
+
+        # Imported here so pages that only need rows never load pandas
+        import pandas as pd
+        return pd.DataFrame(columns, columns=list(row_model._fields), copy=False)
+
+    def _fetch_columns(self, cursor, fields, declared_types):
+        """
+        Builds one array per column by reading the cursor in batches,
+        so the full result never exists as a list of row tuples.
+        INTEGER/REAL columns become float64 with NaN for NULL (like pd.read_sql);
+        an INTEGER column with no NULLs at all is turned back into int64 at the end.
+        """
+        import numpy as np
+
+        numeric = [t in ("INTEGER", "REAL") for t in declared_types]
+        chunks = {name: [] for name in fields}
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            # zip(*batch) turns a batch of rows into one tuple per column
+            for name, is_numeric, values in zip(fields, numeric, zip(*batch)):
+                if is_numeric:
+                    try:
+                        # NumPy turns None into NaN for float arrays
+                        chunks[name].append(np.array(values, dtype=np.float64))
+                        continue
+                    except (TypeError, ValueError):
+                        pass  # SQLite let some text into a numeric column; keep it as objects
+                chunks[name].append(np.array(values, dtype=object))
+
+        columns = {}
+        for name, is_numeric, declared in zip(fields, numeric, declared_types):
+            parts = chunks[name]
+            if not parts:
+                column = np.array([], dtype=np.float64 if is_numeric else object)
+            elif len(parts) == 1:
+                column = parts[0]
+            else:
+                column = np.concatenate(parts)
+            if declared == "INTEGER" and column.dtype == np.float64 and not np.isnan(column).any():
+                column = column.astype(np.int64)
+            columns[name] = column
+        return columns
+
     #  USER MANAGEMENT & MIGRATION
 
     def add_user(self, username, password_hash):
@@ -121,13 +332,9 @@ class DatabaseManager:
         Helper function to add a user safely.
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
             # Parameterized query to prevent SQL Injection
-            cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                           (username, password_hash))
-            conn.commit()
-            conn.close()
+            self.execute_write("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                               (username, password_hash))
             return True
         except sqlite3.IntegrityError:
             return False  # Username already exists
@@ -171,64 +378,44 @@ class DatabaseManager:
 
     #  CYBER INCIDENT CRUD OPERATIONS
 
-    def create_cyber_incident(self, incident_type, severity, status):
+    def create_cyber_incident(self, incident_type, severity, status, username="system"):
         """
         C: Create a new incident.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
         sql = "INSERT INTO cyber_incidents (incident_type, severity, status) VALUES (?, ?, ?)"
-        cursor.execute(sql, (incident_type, severity, status))
-
-        conn.commit()
-        last_id = cursor.lastrowid
-        conn.close()
+        last_id, _ = self.execute_write(sql, (incident_type, severity, status))
+        self.audit.log(username, "create_incident", "cyber_incident", last_id,
+                       {"incident_type": incident_type, "severity": severity, "status": status})
         return last_id
 
-    def read_cyber_incidents(self):
+    def read_cyber_incidents(self, output=OUTPUT_ROWS):
         """
         R: Read all incidents.
+        Defaults to a list of CyberIncident rows; pass output="columns" or
+        output="dataframe" to skip building row objects at all.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        sql = "SELECT id, incident_type, severity, status, timestamp FROM cyber_incidents"
+        return self.fetch(sql, CyberIncident, output)
 
-        sql = "SELECT * FROM cyber_incidents"
-        cursor.execute(sql)
-        incidents = cursor.fetchall()
-
-        conn.close()
-        return incidents
-
-    def update_cyber_incident(self, incident_id, status):
+    def update_cyber_incident(self, incident_id, status, username="system"):
         """
         U: Update an incident's status.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
         sql = "UPDATE cyber_incidents SET status = ? WHERE id = ?"
-        cursor.execute(sql, (status, incident_id))
+        _, rowcount = self.execute_write(sql, (status, incident_id))
+        if rowcount > 0:
+            self.audit.log(username, "update_incident_status", "cyber_incident", incident_id, {"status": status})
+        return rowcount > 0
 
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
-        return success
-
-    def delete_cyber_incident(self, incident_id):
+    def delete_cyber_incident(self, incident_id, username="system"):
         """
         D: Delete an incident.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
         sql = "DELETE FROM cyber_incidents WHERE id = ?"
-        cursor.execute(sql, (incident_id,))
-
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
-        return success
+        _, rowcount = self.execute_write(sql, (incident_id,))
+        if rowcount > 0:
+            self.audit.log(username, "delete_incident", "cyber_incident", incident_id)
+        return rowcount > 0
 
 
 #  TEMPORARY TEST CODE
@@ -0,0 +1,327 @@
+# Load test for the Streamlit pages, run headlessly with Streamlit's AppTest.
+# Simulates many users at once doing: login -> dashboard view -> incident submission -> ticket creation,
+# and reports p50/p95/p99 latency per action, page runs (reruns) and DB queries per action.
+#
+# Usage:
+#   python load_test_pages.py --users 50 --iterations 3
+#   python load_test_pages.py --users 200 --save-baseline baseline.json
+#   python load_test_pages.py --users 200 --compare baseline.json --tolerance 0.25
+#
+# Each simulated user runs in its own process. AppTest is not thread-safe (every run swaps
+# Streamlit's global runtime and config), so sessions sharing one process break each other.
+# That also means 500 users = 500 Python processes, so expect a lot of memory at the top end.
+# This measures the page code and the DB under concurrency, not the Streamlit web server itself.
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import db_manager
+from audit_log import get_audit_logger
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+HOME_PAGE = os.path.join(APP_DIR, "Home.py")
+DASHBOARD_PAGE = os.path.join(APP_DIR, "pages", "1_Dashboard.py")
+IT_OPS_PAGE = os.path.join(APP_DIR, "pages", "4_IT_Operations.py")
+
+ACTIONS = ["login", "dashboard_view", "incident_submit", "ticket_create"]
+
+# Test account created in the scratch copy of the DB (never in the real one)
+LOAD_TEST_USER = "loadtest_user"
+LOAD_TEST_PASSWORD = "LoadTest#2025"
+
+# Generous, because bcrypt logins get slow when hundreds run at once
+PAGE_TIMEOUT_SECONDS = 120
+
+
+class Counters:
+    """
+    Counts page runs and DB queries reported by db_manager's instrumentation hook.
+    There is one session per process, so these counts belong to that session alone.
+    """
+
+    def __init__(self):
+        self.page_runs = 0
+        self.queries = 0
+
+    def listener(self, event, detail):
+        if event == "init":
+            # Every page creates one DatabaseManager at the top, so this is one per script run
+            self.page_runs += 1
+        elif event == "query" and not detail.lstrip().upper().startswith("PRAGMA"):
+            self.queries += 1
+
+
+def click_button(at, label):
+    """ Clicks the button with this label and reruns the page """
+    for button in at.button:
+        if button.label == label:
+            return button.click().run()
+    raise RuntimeError(f"Button not found: {label}")
+
+
+def logged_in_page(path):
+    """ Opens a page as if the load test user had already logged in """
+    at = AppTest.from_file(path, default_timeout=PAGE_TIMEOUT_SECONDS)
+    at.session_state["logged_in"] = True
+    at.session_state["username"] = LOAD_TEST_USER
+    return at
+
+
+#  THE FOUR ACTIONS
+# Each returns the AppTest so the caller can check for errors.
+
+def do_login(state):
+    at = AppTest.from_file(HOME_PAGE, default_timeout=PAGE_TIMEOUT_SECONDS).run()
+    at.text_input(key="login_user").input(LOAD_TEST_USER)
+    at.text_input(key="login_pass").input(LOAD_TEST_PASSWORD)
+    click_button(at, "Log in")
+    if not at.session_state["logged_in"]:
+        raise RuntimeError("Login did not succeed.")
+    return at
+
+
+def do_dashboard_view(state):
+    at = logged_in_page(DASHBOARD_PAGE).run()
+    state["dashboard"] = at  # Reused by the incident submission
+    return at
+
+
+def do_incident_submit(state):
+    at = state.get("dashboard") or logged_in_page(DASHBOARD_PAGE).run()
+    return click_button(at, "Submit Report")
+
+
+def do_ticket_create(state):
+    at = logged_in_page(IT_OPS_PAGE).run()
+    at.text_input[0].input("Load test: laptop will not boot")
+    return click_button(at, "Create Ticket")
+
+
+ACTION_FUNCS = {
+    "login": do_login,
+    "dashboard_view": do_dashboard_view,
+    "incident_submit": do_incident_submit,
+    "ticket_create": do_ticket_create,
+}
+
+
+def run_action(name, state):
+    """ Runs one action and returns (seconds taken, error message or None) """
+    start = time.perf_counter()
+    try:
+        at = ACTION_FUNCS[name](state)
+        error = None
+        if at.exception:
+            error = at.exception[0].message
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, error
+
+
+def run_session(iterations):
+    """
+    One simulated user going through every action, `iterations` times.
+    Runs in its own worker process; returns one record per action run.
+    """
+    counters = Counters()
+    db_manager.set_instrumentation_listener(counters.listener)
+
+    records = []
+    state = {}
+    for _ in range(iterations):
+        for name in ACTIONS:
+            runs_before, queries_before = counters.page_runs, counters.queries
+            seconds, error = run_action(name, state)
+            records.append({
+                "action": name,
+                "seconds": seconds,
+                "error": error,
+                "page_runs": counters.page_runs - runs_before,
+                "db_queries": counters.queries - queries_before,
+            })
+
+    # Worker processes skip atexit, so flush this session's audit trail ourselves
+    get_audit_logger(db_manager.DB_NAME).close()
+    return records
+
+
+def percentile(sorted_values, pct):
+    """ Nearest-rank percentile of an already sorted list """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_report(args, records, elapsed):
+    report = {"users": args.users, "iterations": args.iterations,
+              "elapsed_seconds": round(elapsed, 3), "actions": {},
+              "total_page_runs": sum(r["page_runs"] for r in records),
+              "total_db_queries": sum(r["db_queries"] for r in records)}
+
+    for name in ACTIONS:
+        mine = [r for r in records if r["action"] == name]
+        ok = [r for r in mine if r["error"] is None]
+        latencies = sorted(r["seconds"] for r in mine)
+        report["actions"][name] = {
+            "count": len(mine),
+            "errors": len(mine) - len(ok),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            # Averages over successful runs, so a failure part-way through doesn't skew them
+            "page_runs": round(sum(r["page_runs"] for r in ok) / len(ok), 2) if ok else 0,
+            "db_queries": round(sum(r["db_queries"] for r in ok) / len(ok), 2) if ok else 0,
+        }
+    return report
+
+
+def print_report(report, records):
+    print(f"\n--- Page Load Test: {report['users']} users x {report['iterations']} iterations ---")
+    print(f"{'Action':<18}{'Count':>7}{'Errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Runs':>6}{'Queries':>9}")
+    for name, stats in report["actions"].items():
+        print(f"{name:<18}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['page_runs']:>6}{stats['db_queries']:>9}")
+    print(f"Elapsed: {report['elapsed_seconds']}s  Page runs: {report['total_page_runs']}  "
+          f"DB queries: {report['total_db_queries']}")
+    for name in ACTIONS:
+        messages = {r["error"] for r in records if r["action"] == name and r["error"]}
+        for message in sorted(messages)[:3]:
+            print(f"  {name} error: {message}")
+
+
+def broken_actions(report):
+    """ Actions that failed every single time. These are bugs, not numbers to benchmark. """
+    return [name for name, stats in report["actions"].items()
+            if stats["count"] > 0 and stats["errors"] == stats["count"]]
+
+
+def baseline_mismatch(args, baseline):
+    """ Differences in run size between this run and the baseline (latency at 50 users says nothing about 200) """
+    return [f"--{key}: baseline {baseline.get(key)}, this run {getattr(args, key)}"
+            for key in ("users", "iterations") if baseline.get(key) != getattr(args, key)]
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Flags an action as a regression if its p50/p95/p99 latency grew by more than `tolerance`
+    (0.25 = 25%), it now needs more page runs or DB queries, or it started erroring.
+    Returns a list of problem descriptions (empty means no regressions).
+    """
+    problems = []
+    for name, stats in report["actions"].items():
+        old = baseline["actions"].get(name)
+        if old is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if old.get(key, 0) > 0 and stats[key] > old[key] * (1 + tolerance):
+                problems.append(f"{name} {key}: {old[key]} -> {stats[key]}")
+        for key in ("page_runs", "db_queries"):
+            if stats[key] > old[key]:
+                problems.append(f"{name} {key}: {old[key]} -> {stats[key]}")
+        if stats["errors"] > 0:
+            problems.append(f"{name} errors: {stats['errors']} of {stats['count']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load test for the Streamlit pages")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent user sessions (one process each)")
+    parser.add_argument("--iterations", type=int, default=3, help="Times each user repeats the flow")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Save this run's results as the baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed latency growth vs baseline")
+    args = parser.parse_args()
+
+    # Resolve these before we change directory
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Check the baseline fits this run before spending minutes on it
+    baseline = None
+    if compare_path:
+        with open(compare_path) as f:
+            baseline = json.load(f)
+        mismatch = baseline_mismatch(args, baseline)
+        if mismatch:
+            print("BASELINE NOT COMPARABLE: it was recorded with a different run size.")
+            for m in mismatch:
+                print(f"  {m}")
+            print("Re-run with the same --users and --iterations as the baseline.")
+            return 1
+
+    # The pages open DB_NAME relative to the working directory, so run inside a scratch
+    # folder holding a copy of the DB. The real platform DB is never touched.
+    # Worker processes inherit this working directory.
+    original_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="platform_pages_load_")
+    source_db = os.path.join(APP_DIR, db_manager.DB_NAME)
+    if os.path.exists(source_db):
+        shutil.copy(source_db, os.path.join(work_dir, db_manager.DB_NAME))
+    os.chdir(work_dir)
+    # The scratch copy is written directly. If this shell points at a writer service,
+    # those writes would go to (or be refused by) the writer's DB instead. Workers inherit this.
+    os.environ.pop(db_manager.WRITER_SOCKET_ENV, None)
+
+    try:
+        # Imported only now: auth.py opens DB_NAME relative to the working directory as soon as
+        # it's imported, and that must be the scratch copy, not the real platform DB
+        from auth import hash_password
+
+        # Create/migrate the copy, switch it to WAL and add the test user before any session starts
+        db = db_manager.DatabaseManager()
+        db.get_connection().close()
+        db.add_user(LOAD_TEST_USER, hash_password(LOAD_TEST_PASSWORD))
+
+        start = time.perf_counter()
+        # maxtasksperchild=1: every session gets a fresh process of its own
+        with multiprocessing.Pool(processes=args.users, maxtasksperchild=1) as pool:
+            per_session = pool.map(run_session, [args.iterations] * args.users, chunksize=1)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    records = [r for session in per_session for r in session]
+    report = build_report(args, records, elapsed)
+    print_report(report, records)
+
+    broken = broken_actions(report)
+    if broken:
+        print(f"\nFAILED: these actions errored on every attempt: {', '.join(broken)}")
+        print("Fix them before benchmarking; no baseline was saved or compared.")
+        return 2
+
+    exit_code = 0
+    if save_path:
+        if any(stats["errors"] for stats in report["actions"].values()):
+            # A baseline with errors in it would make those errors look normal
+            print("\nNot saving baseline: this run had errors.")
+            exit_code = 1
+        else:
+            with open(save_path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Baseline saved to {save_path}")
+
+    if baseline is not None:
+        problems = compare_to_baseline(report, baseline, args.tolerance)
+        if problems:
+            print("\nREGRESSIONS vs baseline:")
+            for p in problems:
+                print(f"  {p}")
+            exit_code = 1
+        else:
+            print("\nNo regressions vs baseline.")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
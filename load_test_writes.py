@@ -0,0 +1,121 @@
+# Load test for multi-process writes.
+# Simulates N Streamlit processes x M users each creating incidents at the same time,
+# and checks the platform keeps up with a target write throughput without "database is locked" errors.
+#
+# Usage:
+#   python load_test_writes.py --processes 4 --users 25 --writes 20 --target 500
+#   python load_test_writes.py --mode direct   (no writer service, every process writes itself)
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from db_manager import DB_NAME, WRITER_SOCKET_ENV, DatabaseManager
+from write_coordinator import WriterService
+
+
+def run_worker_process(db_path, socket_path, users, writes_per_user, results):
+    """ One "Streamlit process": M user threads, each doing a number of incident writes """
+    if socket_path:
+        os.environ[WRITER_SOCKET_ENV] = socket_path
+    else:
+        os.environ.pop(WRITER_SOCKET_ENV, None)
+
+    errors = []
+    try:
+        db = DatabaseManager(db_path)
+
+        def user_session(user_no):
+            for i in range(writes_per_user):
+                try:
+                    db.create_cyber_incident("Load Test", "Low", f"user {user_no} write {i}")
+                except Exception as e:
+                    errors.append(str(e))
+
+        threads = [threading.Thread(target=user_session, args=(u,)) for u in range(users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # Child processes skip atexit, so flush the audit trail ourselves
+        db.audit.close()
+    except Exception as e:
+        # Count every write this process didn't get to as failed
+        missing = users * writes_per_user - len(errors)
+        errors.extend([f"worker crashed: {e}"] * missing)
+    finally:
+        # Always report back, or the parent would wait forever
+        results.put(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process write load test")
+    parser.add_argument("--processes", type=int, default=4, help="Number of server processes (N)")
+    parser.add_argument("--users", type=int, default=25, help="Concurrent users per process (M)")
+    parser.add_argument("--writes", type=int, default=20, help="Writes per user")
+    parser.add_argument("--target", type=float, default=500, help="Required writes per second")
+    parser.add_argument("--mode", choices=["service", "direct"], default="service")
+    args = parser.parse_args()
+
+    # Work on a copy so the real platform DB is never filled with test rows
+    work_dir = tempfile.mkdtemp(prefix="platform_load_")
+    db_path = os.path.join(work_dir, "load_test.db")
+    if os.path.exists(DB_NAME):
+        shutil.copy(DB_NAME, db_path)
+    # Create/migrate the copy and switch it to WAL before any worker starts, like a real deployment
+    DatabaseManager(db_path).get_connection().close()
+
+    service = None
+    socket_path = None
+    if args.mode == "service":
+        socket_path = os.path.join(work_dir, "writer.sock")
+        service = WriterService(db_path, socket_path)
+        service.start()
+
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=run_worker_process,
+                                args=(db_path, socket_path, args.users, args.writes, results))
+        for _ in range(args.processes)
+    ]
+
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    errors = []
+    for _ in procs:
+        errors.extend(results.get())
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    if service is not None:
+        service.stop()
+
+    total = args.processes * args.users * args.writes
+    succeeded = total - len(errors)
+    throughput = succeeded / elapsed if elapsed > 0 else 0.0
+
+    print(f"\n--- Write Load Test ({args.mode}) ---")
+    print(f"{args.processes} processes x {args.users} users x {args.writes} writes = {total} writes")
+    print(f"Succeeded: {succeeded}  Failed: {len(errors)}")
+    print(f"Elapsed: {elapsed:.2f}s  Throughput: {throughput:.0f} writes/s (target {args.target:.0f})")
+    if service is not None and service.batches_committed:
+        print(f"Group commits: {service.batches_committed} "
+              f"(avg {service.writes_committed / service.batches_committed:.1f} writes per commit)")
+    for message in sorted(set(errors))[:5]:
+        print(f"  Error: {message}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    passed = not errors and throughput >= args.target
+    print("PASS" if passed else "FAIL")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
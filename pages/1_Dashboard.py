@@ -1,6 +1,5 @@
 # Week 9: Cyber Incident Dashboard logic
 import streamlit as st
-import pandas as pd
 from db_manager import DatabaseManager
 
 st.set_page_config(page_title="Cyber Dashboard", page_icon="📊", layout="wide")
@@ -40,17 +39,15 @@ with st.expander("➕ Report New Incident"):
 
         submitted = st.form_submit_button("Submit Report")
         if submitted:
-            db.create_cyber_incident(i_type, severity, status)
+            db.create_cyber_incident(i_type, severity, status, username=st.session_state.username)
             st.success("Incident logged!")
             st.rerun()  # Refresh page to show new data
 
 # 2. DATA DISPLAY (Mini Dashboard Concept)
-incidents = db.read_cyber_incidents()
-
-if incidents:
-    # Convert DB data to DataFrame
-    df = pd.DataFrame(incidents, columns=["ID", "Type", "Severity", "Status", "Time"])
+# Ask the DB for a DataFrame directly (built from column arrays, no list of tuples in between)
+df = db.read_cyber_incidents(output="dataframe")
 
+if not df.empty:
     st.divider()
 
     # Layout Columns
@@ -59,17 +56,20 @@ if incidents:
     with col_left:
         st.subheader("Incident Counts by Type")
         # Using built-in Streamlit charts as per Lecture Part 3
-        type_counts = df["Type"].value_counts()
+        type_counts = df["incident_type"].value_counts()
         st.bar_chart(type_counts)
 
     with col_right:
         st.subheader("Severity Distribution")
         # Using Area chart as per Lecture "Mini Dashboard" example
-        sev_counts = df["Severity"].value_counts()
+        sev_counts = df["severity"].value_counts()
         st.area_chart(sev_counts)
 
     with st.expander("See raw data (Database View)"):
-        st.dataframe(df)
+        # Friendly headers for display only (copy=False so the data isn't duplicated)
+        display_df = df.rename(columns={"id": "ID", "incident_type": "Type", "severity": "Severity",
+                                        "status": "Status", "timestamp": "Time"}, copy=False)
+        st.dataframe(display_df)
 
 else:
     st.info("No incidents found. Add one above!")
@@ -18,7 +18,8 @@ with st.form("ticket_form"):
         agent = st.selectbox("Assign to Agent", ["Alice", "Bob", "Charlie", "System"])
 
     if st.form_submit_button("Create Ticket"):
-        db.create_it_ticket(issue, priority, agent)
+        # This page has no login check, so fall back to "anonymous" for the audit trail
+        db.create_it_ticket(issue, priority, agent, username=st.session_state.get("username") or "anonymous")
         st.success("Ticket Assigned!")
         st.rerun()
 
@@ -32,7 +33,7 @@ if not tickets.empty:
     with col1:
         st.subheader("Agent Workload")
         # Bar chart: Who has the most tickets? (Solves 'Staff Performance' problem)
-        workload = tickets['ticket_id'].value_counts()  # ticket_id column holds Agent Name
+        workload = tickets['assigned_to'].value_counts()
         st.bar_chart(workload)
 
     with col2:
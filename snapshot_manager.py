@@ -0,0 +1,241 @@
+import sqlite3
+import os
+import csv
+import glob
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from db_manager import DB_NAME, BUSY_TIMEOUT_SECONDS, retry_on_busy
+
+# Where point-in-time copies of the live database are kept
+SNAPSHOT_DIR = "snapshots"
+
+# How many DB pages the backup copies per step, and how long it pauses between steps.
+# Small steps mean the live database is only locked for a moment at a time.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_SLEEP_SECONDS = 0.005
+
+# How many rows are written to an export file at a time
+EXPORT_BATCH_SIZE = 10000
+
+# Memory-map up to this many bytes when reading a snapshot (256 MB)
+SNAPSHOT_MMAP_SIZE = 256 * 1024 * 1024
+
+
+class SnapshotManager:
+    """
+    Makes read-only copies of the live database for analysts and backups.
+    Long reports run against a snapshot, so they never compete with the pages writing to the live DB.
+    """
+
+    def __init__(self, db_name=DB_NAME, snapshot_dir=SNAPSHOT_DIR, keep=7):
+        self.db_name = db_name
+        self.snapshot_dir = snapshot_dir
+        self.keep = keep  # Retention: how many snapshots to keep on disk
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def take_snapshot(self, dest_path=None):
+        """
+        Copies the live DB using SQLite's online backup API.
+        The copy is consistent (one point in time) even while the pages keep writing.
+        Returns the path of the new snapshot file.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        if dest_path is None:
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            dest_path = os.path.join(self.snapshot_dir, f"snapshot_{stamp}.db")
+
+        # Write to a temp name first so a half-finished copy is never picked up as a snapshot
+        tmp_path = dest_path + ".part"
+
+        def attempt():
+            # Short busy timeout plus retry_on_busy, like every other DB access (no 30 second stalls)
+            source = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_SECONDS)
+            target = sqlite3.connect(tmp_path)
+            try:
+                source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_SLEEP_SECONDS)
+                # The live DB uses WAL; switch the copy back to a plain single file so it opens read-only cleanly
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+                source.close()
+
+        try:
+            retry_on_busy(attempt)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            # Don't leave a half-written copy lying around
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return dest_path
+
+    def list_snapshots(self):
+        """ Returns snapshot paths, oldest first """
+        pattern = os.path.join(self.snapshot_dir, "snapshot_*.db")
+        return sorted(glob.glob(pattern))
+
+    def apply_retention(self):
+        """ Deletes the oldest snapshots so only self.keep remain """
+        snapshots = self.list_snapshots()
+        removed = snapshots[:-self.keep] if self.keep > 0 else snapshots
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def open_snapshot(self, snapshot_path):
+        """
+        Opens a snapshot read-only, with memory-mapped I/O for fast long-running reports.
+        """
+        # as_uri() escapes characters like # and ? that would otherwise cut the URI short
+        uri = Path(snapshot_path).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.execute(f"PRAGMA mmap_size = {SNAPSHOT_MMAP_SIZE}")
+        return conn
+
+    def export_table(self, snapshot_path, table, out_path, fmt="csv"):
+        """
+        Streams one table from a snapshot to a CSV or Parquet file in batches,
+        so the whole table is never held in memory.
+        Returns the number of rows written.
+        """
+        if fmt not in ("csv", "parquet"):
+            raise ValueError(f"Unknown export format: {fmt!r}")
+
+        conn = self.open_snapshot(snapshot_path)
+        try:
+            # Only allow real table names (they can't be passed as ? parameters)
+            known = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if table not in known:
+                raise ValueError(f"Table not found in snapshot: {table}")
+
+            cursor = conn.execute(f'SELECT * FROM "{table}"')
+            headers = [col[0] for col in cursor.description]
+            if fmt == "csv":
+                return self._write_csv(cursor, headers, out_path)
+            # Declared column types, e.g. {"id": "INTEGER", "severity": "TEXT"}
+            declared = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+            return self._write_parquet(cursor, headers, [declared.get(h, "") for h in headers], out_path)
+        finally:
+            conn.close()
+
+    def _write_csv(self, cursor, headers, out_path):
+        # Same as Parquet: write to a temp name and only rename on success
+        tmp_path = out_path + ".part"
+        count = 0
+        try:
+            with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(headers)
+                while True:
+                    batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                    if not batch:
+                        break
+                    writer.writerows(batch)
+                    count += len(batch)
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return count
+
+    def _write_parquet(self, cursor, headers, declared_types, out_path):
+        # pyarrow is optional: only needed if someone actually asks for Parquet
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow. Install it with: pip install pyarrow")
+
+        # The schema comes from the table definition, not from the first batch,
+        # so a column that happens to be all NULL at the start still gets its real type
+        arrow_types = [self._arrow_type(pa, declared) for declared in declared_types]
+        schema = pa.schema(list(zip(headers, arrow_types)))
+
+        # Write to a temp name and only rename on success, so a failed export leaves no broken file
+        tmp_path = out_path + ".part"
+        count = 0
+        try:
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                while True:
+                    batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                    if not batch:
+                        break
+                    arrays = []
+                    for values, arrow_type in zip(zip(*batch), arrow_types):
+                        if arrow_type == pa.string():
+                            # SQLite doesn't enforce types, so make sure text columns really hold text
+                            values = [None if v is None else str(v) for v in values]
+                        arrays.append(pa.array(values, type=arrow_type))
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                    count += len(batch)
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return count
+
+    def _arrow_type(self, pa, declared):
+        """
+        Maps a declared SQLite column type to an Arrow type, using SQLite's own affinity rules.
+        Anything that isn't clearly a number or binary (TEXT, DATETIME, no type...) is exported as text.
+        """
+        declared = declared.upper()
+        if "INT" in declared:
+            return pa.int64()
+        if "BLOB" in declared:
+            return pa.binary()
+        if "CHAR" in declared or "CLOB" in declared or "TEXT" in declared:
+            return pa.string()
+        if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+            return pa.float64()
+        return pa.string()
+
+    #  SCHEDULED SNAPSHOTS
+
+    def start_schedule(self, interval_seconds=3600):
+        """
+        Takes a snapshot every interval_seconds on a background thread,
+        then deletes old ones past the retention limit.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_schedule, args=(interval_seconds,), daemon=True)
+        self._thread.start()
+
+    def stop_schedule(self):
+        """ Stops the background snapshot thread """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run_schedule(self, interval_seconds):
+        while not self._stop_event.is_set():
+            try:
+                path = self.take_snapshot()
+                self.apply_retention()
+                print(f"Snapshot saved: {path}")
+            except (sqlite3.Error, OSError) as e:
+                # Don't kill the thread on one bad run (locked DB, disk full, permissions); try again next interval
+                print(f"Snapshot failed: {e}")
+            self._stop_event.wait(interval_seconds)
+
+
+#  TEMPORARY TEST CODE
+if __name__ == "__main__":
+    snaps = SnapshotManager()
+
+    path = snaps.take_snapshot()
+    print(f"Created snapshot: {path}")
+
+    rows = snaps.export_table(path, "cyber_incidents", "cyber_incidents_export.csv")
+    print(f"Exported {rows} incidents to cyber_incidents_export.csv")
+
+    removed = snaps.apply_retention()
+    print(f"Removed {len(removed)} old snapshots")
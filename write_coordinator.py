@@ -0,0 +1,351 @@
+import sqlite3
+import os
+import json
+import queue
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from audit_log import create_audit_table
+from db_manager import DB_NAME, BUSY_TIMEOUT_SECONDS, WRITER_SOCKET_ENV, is_busy_error, retry_on_busy
+
+# Default socket the writer listens on (a local file, so only processes on this machine can use it)
+WRITER_SOCKET_PATH = "/tmp/platform_writer.sock"
+
+# Group commit settings: gather up to this many writes, or wait this long for more, then commit once
+MAX_BATCH_SIZE = 500
+MAX_BATCH_WAIT_SECONDS = 0.005
+
+# The writer only accepts data-changing statements, never schema changes
+ALLOWED_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+# How long a client waits for the writer to answer
+CLIENT_TIMEOUT_SECONDS = 30
+
+# How long the writer waits for its own commit thread before answering with an error.
+# Shorter than the client timeout, so the client gets a proper reply instead of a socket timeout.
+SUBMIT_TIMEOUT_SECONDS = 20
+
+# How many connections can wait to be accepted (the socketserver default of 5 is far too low)
+LISTEN_BACKLOG = 512
+CONNECT_RETRIES = 8
+
+
+class WriterSocketServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+    def server_bind(self):
+        super().server_bind()
+        # Only this user may connect. Done before listen(), so nobody can connect in between.
+        os.chmod(self.server_address, 0o600)
+
+
+class PendingWrite:
+    """
+    One write waiting in the queue. The socket handler thread waits on `done`
+    until the committer thread has filled in the result.
+    With many=True, params is a list of parameter tuples run with executemany.
+    """
+    __slots__ = ("sql", "params", "many", "done", "result", "error")
+
+    def __init__(self, sql, params, many=False):
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WriterService:
+    """
+    The single writer for the whole deployment.
+    Every Streamlit process sends its writes here over a Unix socket; one thread
+    applies them in batches and commits each batch once (a "group commit").
+    Readers keep opening the DB directly, which is safe because it is in WAL mode.
+    """
+
+    def __init__(self, db_name=DB_NAME, socket_path=WRITER_SOCKET_PATH):
+        self.db_name = db_name
+        # Clients send the DB they mean to write to; it is checked against this
+        self.db_path = os.path.realpath(db_name)
+        self.socket_path = socket_path
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._server = None
+        self._commit_thread = None
+        self._threads = []
+        # Simple counters so the load test can see how well batching worked
+        self.writes_committed = 0
+        self.batches_committed = 0
+
+    def submit(self, sql, params, many=False):
+        """ Queues a write and blocks until it has been committed. Returns (lastrowid, rowcount). """
+        if not isinstance(sql, str) or not sql.lstrip().upper().startswith(ALLOWED_STATEMENTS):
+            raise ValueError("Writer service only accepts INSERT, UPDATE or DELETE statements.")
+        if not self._committer_alive():
+            raise sqlite3.OperationalError("Writer service is not committing (its commit thread has stopped).")
+        pending = PendingWrite(sql, params, many)
+        self._queue.put(pending)
+
+        # Never wait forever: if the commit thread dies or stalls, fail instead of hanging the caller
+        deadline = time.monotonic() + SUBMIT_TIMEOUT_SECONDS
+        while not pending.done.wait(0.5):
+            if not self._committer_alive():
+                raise sqlite3.OperationalError("Writer service stopped committing before this write finished.")
+            if time.monotonic() >= deadline:
+                raise sqlite3.OperationalError(
+                    f"Writer service did not commit within {SUBMIT_TIMEOUT_SECONDS}s; the write may still be applied.")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _committer_alive(self):
+        return self._commit_thread is not None and self._commit_thread.is_alive()
+
+    def start(self):
+        """ Starts the committer thread and the socket server in the background """
+        if os.path.exists(self.socket_path):
+            # Only remove the socket if nobody is listening on it. If another writer answers,
+            # starting a second one would break the single-writer guarantee.
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.remove(self.socket_path)  # Left over from a previous run that crashed
+            else:
+                raise RuntimeError(f"Another writer service is already running on {self.socket_path}.")
+            finally:
+                probe.close()
+
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # One JSON request per line; a client can send many over one connection
+                for line in self.rfile:
+                    self.wfile.write(service._handle_line(line))
+
+        self._server = WriterSocketServer(self.socket_path, Handler)
+
+        self._stop_event.clear()
+        self._commit_thread = threading.Thread(target=self._commit_loop, daemon=True)
+        self._threads = [
+            self._commit_thread,
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        print(f"Writer service listening on {self.socket_path}")
+
+    def stop(self):
+        """ Stops accepting writes, commits whatever is still queued, and cleans up the socket """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._stop_event.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _handle_line(self, line):
+        """ Turns one JSON request into one JSON reply (both newline-terminated) """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object.")
+            self._check_db(request.get("db"))
+            if "many" in request:
+                params_list = request["many"]
+                if not isinstance(params_list, list) or not all(isinstance(p, list) for p in params_list):
+                    raise ValueError("'many' must be a list of parameter lists.")
+                lastrowid, rowcount = self.submit(request["sql"], params_list, many=True)
+            else:
+                params = request.get("params", [])
+                if not isinstance(params, list):
+                    raise ValueError("'params' must be a list.")
+                lastrowid, rowcount = self.submit(request["sql"], params)
+            reply = {"ok": True, "lastrowid": lastrowid, "rowcount": rowcount}
+        except sqlite3.IntegrityError as e:
+            reply = {"ok": False, "error": "IntegrityError", "message": str(e)}
+        except Exception as e:
+            reply = {"ok": False, "error": type(e).__name__, "message": str(e)}
+        return (json.dumps(reply) + "\n").encode("utf-8")
+
+    def _check_db(self, db_path):
+        """
+        Refuses writes meant for a different database file, e.g. a process pointed at
+        this writer's socket while working on its own copy of the DB.
+        """
+        if db_path is not None and os.path.realpath(db_path) != self.db_path:
+            raise sqlite3.OperationalError(
+                f"Writer service writes to {self.db_path}, not {db_path}. "
+                f"Point {WRITER_SOCKET_ENV} at the writer for that database, or unset it.")
+
+    def _next_batch(self):
+        """ Waits for one write, then grabs any others that arrive within the batch window """
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + MAX_BATCH_WAIT_SECONDS
+        while len(batch) < MAX_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline we still take anything already queued, we just stop waiting
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit_loop(self):
+        conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # The writer owns the schema for tables that every process appends to
+        create_audit_table(conn)
+        try:
+            # Keep going after stop() until the queue is drained, so no accepted write is lost
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if batch:
+                    self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn, batch):
+        """
+        Runs a whole batch inside one transaction and commits once.
+        Each write gets its own SAVEPOINT, so one bad write (e.g. a duplicate username)
+        only fails itself and not the rest of the batch.
+        """
+        def attempt():
+            results = []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for pending in batch:
+                    conn.execute("SAVEPOINT write_item")
+                    try:
+                        if pending.many:
+                            cursor = conn.executemany(pending.sql, pending.params)
+                        else:
+                            cursor = conn.execute(pending.sql, pending.params)
+                        results.append(((cursor.lastrowid, cursor.rowcount), None))
+                        conn.execute("RELEASE write_item")
+                    except Exception as e:
+                        # Not just sqlite3.Error: bad params (e.g. a number where a list belongs) raise
+                        # TypeError/ValueError, and that must fail this write, not kill the commit thread
+                        conn.execute("ROLLBACK TO write_item")
+                        conn.execute("RELEASE write_item")
+                        # A lock problem affects the whole batch, so let retry_on_busy redo it
+                        if is_busy_error(e):
+                            raise
+                        results.append((None, e))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return results
+
+        try:
+            results = retry_on_busy(attempt)
+        except Exception as e:
+            # Every waiting write gets the error; the commit thread carries on with the next batch
+            results = [(None, e)] * len(batch)
+
+        for pending, (result, error) in zip(batch, results):
+            pending.result = result
+            pending.error = error
+            pending.done.set()
+
+        self.batches_committed += 1
+        self.writes_committed += sum(1 for _, error in results if error is None)
+
+
+class WriteClient:
+    """
+    Sends writes to the WriterService. Used by DatabaseManager.execute_write
+    when PLATFORM_WRITER_SOCKET is set.
+    """
+
+    def __init__(self, socket_path=WRITER_SOCKET_PATH, db_name=None):
+        self.socket_path = socket_path
+        # The DB this client means to write to; the writer refuses the write if it serves another one
+        self.db_name = db_name
+
+    def execute(self, sql, params=()):
+        """ Sends one write and waits for the reply. Returns (lastrowid, rowcount). """
+        return self._send({"sql": sql, "params": list(params)})
+
+    def execute_many(self, sql, params_list):
+        """ Sends one statement with many parameter rows (like executemany), committed together """
+        return self._send({"sql": sql, "many": [list(params) for params in params_list]})
+
+    def _send(self, payload):
+        if self.db_name is not None:
+            payload["db"] = os.path.realpath(self.db_name)
+        request = json.dumps(payload) + "\n"
+        try:
+            with self._connect() as sock:
+                sock.sendall(request.encode("utf-8"))
+                with sock.makefile("rb") as reader:
+                    line = reader.readline()
+        except OSError as e:
+            # Timeouts, resets, permission errors...: report them like any other DB failure
+            raise sqlite3.OperationalError(f"Writer service at {self.socket_path} failed: {e}") from e
+
+        if not line:
+            raise sqlite3.OperationalError("Writer service closed the connection without replying.")
+        reply = json.loads(line)
+        if reply["ok"]:
+            return reply["lastrowid"], reply["rowcount"]
+        # Raise the same kind of error a direct write would, so callers (like add_user) behave the same
+        if reply["error"] == "IntegrityError":
+            raise sqlite3.IntegrityError(reply["message"])
+        if reply["error"] == "ValueError":
+            raise ValueError(reply["message"])
+        raise sqlite3.OperationalError(reply["message"])
+
+    def _connect(self):
+        """ Connects to the writer, retrying with jitter if its accept queue is momentarily full """
+        for attempt in range(CONNECT_RETRIES + 1):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CLIENT_TIMEOUT_SECONDS)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except FileNotFoundError:
+                sock.close()
+                raise sqlite3.OperationalError(
+                    f"Writer service is not running (no socket at {self.socket_path}). "
+                    f"Start it with: python write_coordinator.py")
+            except (BlockingIOError, ConnectionRefusedError) as e:
+                sock.close()
+                if attempt == CONNECT_RETRIES:
+                    raise sqlite3.OperationalError(f"Could not reach the writer service at {self.socket_path}: {e}")
+                time.sleep(random.uniform(0, 0.01 * (2 ** attempt)))
+
+
+#  RUN THE WRITER SERVICE
+if __name__ == "__main__":
+    # Start this once, then start each Streamlit process with
+    #   PLATFORM_WRITER_SOCKET=/tmp/platform_writer.sock streamlit run Home.py --server.port 85xx
+    service = WriterService()
+    service.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping writer service...")
+    finally:
+        service.stop()
+        print(f"Committed {service.writes_committed} writes in {service.batches_committed} batches.")